@@ -7,6 +7,7 @@ DATA_DIR = PROJECT_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 VECTOR_DB_DIR = DATA_DIR / "vectors"
+MODEL_CACHE_DIR = DATA_DIR / "models"
 
 # Model configurations
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
@@ -24,5 +25,5 @@ TOP_K_RETRIEVAL = 5
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 # Create directories if they don't exist
-for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, VECTOR_DB_DIR]:
+for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, VECTOR_DB_DIR, MODEL_CACHE_DIR]:
     dir_path.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
@@ -40,10 +40,11 @@ def check_system_health():
         health_status['checks']['directories'] = f'failed: {e}'
         health_status['status'] = 'unhealthy'
     
-    # Check if HuggingFace API is accessible (optional)
+    # Check if HuggingFace API is accessible (optional); HEAD skips downloading the page body
     try:
-        response = requests.get('https://huggingface.co', timeout=5)
-        health_status['checks']['external_api'] = 'passed' if response.status_code == 200 else 'failed'
+        with requests.Session() as session:
+            response = session.head('https://huggingface.co', timeout=5, allow_redirects=False)
+        health_status['checks']['external_api'] = 'passed' if response.status_code < 500 else 'failed'
     except:
         health_status['checks']['external_api'] = 'failed'
     
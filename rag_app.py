@@ -1,17 +1,19 @@
 #!/usr/bin/env python3
 
 import streamlit as st
+import numpy as np
 import sys
 import os
+import threading
 sys.path.append('src')
 
 from data_loader import DataLoader
 from text_chunker import TextChunker
-from config.config import RAW_DATA_DIR, PROCESSED_DATA_DIR, VECTOR_DB_DIR
-import requests
+from retrieval import HuggingFaceEncoder, LocalEncoder, VectorIndex, local_encoder_available, corpus_cache_key, load_corpus_cache, save_corpus_cache
+from config.config import RAW_DATA_DIR, PROCESSED_DATA_DIR, VECTOR_DB_DIR, MODEL_CACHE_DIR
 import json
 import time
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, NamedTuple, Optional
 
 # Page configuration
 st.set_page_config(
@@ -57,78 +59,116 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner="Loading embedding model...")
+def load_local_encoder(model_name: str) -> LocalEncoder:
+    """Load the quantized embedding model once per server process"""
+    return LocalEncoder(MODEL_CACHE_DIR, model_name)
+
+class Corpus(NamedTuple):
+    """A loaded corpus, published as one immutable snapshot so readers never mix two loads"""
+    chunks: List[Dict]
+    chunk_texts: List[str]
+    chunk_filenames: np.ndarray
+    document_count: int
+    index: Optional[VectorIndex]
+    cache_key: Optional[str]
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict], document_count: int, index: VectorIndex, cache_key: str) -> 'Corpus':
+        """Keep chunks alongside column arrays so results can be gathered by index"""
+        return cls(
+            chunks,
+            [chunk['content'] for chunk in chunks],
+            np.array([chunk['filename'] for chunk in chunks], dtype=object),
+            document_count,
+            index,
+            cache_key
+        )
+
+EMPTY_CORPUS = Corpus([], [], np.empty(0, dtype=object), 0, None, None)
+
 class StreamlitRAG:
-    """Streamlit RAG Application"""
+    """Streamlit RAG Application
+    
+    One instance is shared by every session (see get_rag), so the processed corpus
+    survives reruns and is loaded once per server rather than once per browser tab.
+    Loads replace self.corpus wholesale, so callers read it once and use that snapshot.
+    """
     
     def __init__(self):
         self.model = "sentence-transformers/all-MiniLM-L6-v2"
-        self.api_url = f"https://api-inference.huggingface.co/models/{self.model}"
-        self.chunks = []
+        self.chunk_size = 600
+        self.chunk_overlap = 100
+        self.encoder = None
+        self.corpus = EMPTY_CORPUS
+        self._load_lock = threading.Lock()
+    
+    def get_encoder(self, api_token: str):
+        """Prefer the in-process model, else reuse one API encoder per token so repeated queries hit its cache"""
+        if local_encoder_available():
+            return load_local_encoder(self.model)
         
-    def load_documents(self):
-        """Load and process documents"""
+        if self.encoder is None or self.encoder.api_token != api_token:
+            self.encoder = HuggingFaceEncoder(api_token, self.model)
+        return self.encoder
+        
+    def load_documents(self, api_token: str) -> Corpus:
+        """Load, process and embed documents, reusing the in-memory corpus while files are unchanged"""
         if 'chunks_loaded' not in st.session_state:
-            with st.spinner("Loading and processing documents..."):
-                loader = DataLoader(RAW_DATA_DIR)
-                documents = loader.load_documents_from_directory()
-                
-                if not documents:
-                    st.error("No documents found in the data/raw directory!")
-                    return []
+            with st.spinner("Loading and processing documents..."), self._load_lock:
+                cache_key = corpus_cache_key(RAW_DATA_DIR, self.model, self.chunk_size, self.chunk_overlap)
                 
-                chunker = TextChunker(chunk_size=600, chunk_overlap=100)
-                chunks = chunker.process_documents(documents, "recursive")
-                self.chunks = chunker.validate_chunks(chunks)
+                if cache_key != self.corpus.cache_key:
+                    # Reuse the processed corpus if no document has changed since the last run
+                    cached = load_corpus_cache(VECTOR_DB_DIR, cache_key)
+                    
+                    if cached:
+                        chunks, document_count, index = cached
+                        self.corpus = Corpus.from_chunks(chunks, document_count, index, cache_key)
+                    else:
+                        loader = DataLoader(RAW_DATA_DIR)
+                        documents = loader.load_documents_from_directory()
+                        
+                        if not documents:
+                            st.error("No documents found in the data/raw directory!")
+                            return EMPTY_CORPUS
+                        
+                        chunker = TextChunker(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+                        chunks = chunker.validate_chunks(chunker.process_documents(documents, "recursive"))
+                        
+                        # Embed every chunk once so each query only has to embed itself
+                        try:
+                            chunk_texts = [chunk['content'] for chunk in chunks]
+                            index = VectorIndex(self.get_encoder(api_token).encode(chunk_texts))
+                        except Exception as e:
+                            st.error(f"Error embedding documents: {e}")
+                            return EMPTY_CORPUS
+                        
+                        save_corpus_cache(VECTOR_DB_DIR, cache_key, chunks, len(documents), index)
+                        self.corpus = Corpus.from_chunks(chunks, len(documents), index, cache_key)
                 
                 st.session_state.chunks_loaded = True
-                st.session_state.chunks = self.chunks
-                st.session_state.document_count = len(documents)
-                
-                return self.chunks
-        else:
-            self.chunks = st.session_state.chunks
-            return self.chunks
-    
-    def search_similar_chunks(self, query: str, api_token: str, top_k: int = 5) -> List[Tuple[Dict, float]]:
-        """Find most similar chunks using HuggingFace API"""
-        if not self.chunks:
-            return []
-        
-        chunk_texts = [chunk['content'] for chunk in self.chunks]
         
-        payload = {
-            "inputs": {
-                "source_sentence": query,
-                "sentences": chunk_texts
-            }
-        }
-        
-        headers = {"Authorization": f"Bearer {api_token}"}
+        return self.corpus
+    
+    def search_similar_chunks(self, corpus: Corpus, query: str, api_token: str, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the (chunk indices, similarity scores) of corpus's most similar chunks, best first"""
+        no_results = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32))
+        if not corpus.chunks or corpus.index is None:
+            return no_results
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                similarities = response.json()
-                
-                # Pair chunks with similarity scores
-                chunk_similarity_pairs = list(zip(self.chunks, similarities))
-                
-                # Sort by similarity (highest first)
-                chunk_similarity_pairs.sort(key=lambda x: x[1], reverse=True)
-                
-                return chunk_similarity_pairs[:top_k]
-                
-            elif response.status_code == 503:
-                st.warning("⏳ Model is loading. Please wait a moment and try again.")
-                return []
-            else:
-                st.error(f"API Error: {response.status_code} - {response.text}")
-                return []
-                
+            query_embedding = self.get_encoder(api_token).encode_query(query)
         except Exception as e:
             st.error(f"Error calling API: {e}")
-            return []
+            return no_results
+        
+        return corpus.index.search(query_embedding, top_k)
+
+@st.cache_resource
+def get_rag() -> StreamlitRAG:
+    """Create the RAG system once per server process instead of on every rerun"""
+    return StreamlitRAG()
 
 def main():
     """Main Streamlit application"""
@@ -138,7 +178,7 @@ def main():
     st.markdown("---")
     
     # Initialize RAG system
-    rag = StreamlitRAG()
+    rag = get_rag()
     
     # Sidebar
     with st.sidebar:
@@ -176,16 +216,17 @@ def main():
         st.header("📚 Document Processing")
         
         if st.button("🔄 Load Documents", type="primary"):
-            chunks = rag.load_documents()
-            if chunks:
-                st.success(f"✅ Loaded {len(chunks)} chunks from {st.session_state.get('document_count', 0)} documents")
+            corpus = rag.load_documents(api_token)
+            if corpus.chunks:
+                st.success(f"✅ Loaded {len(corpus.chunks)} chunks from {corpus.document_count} documents")
         
         # Show document status
         if 'chunks_loaded' in st.session_state:
+            corpus = rag.corpus
             st.markdown('<div class="sidebar-info">', unsafe_allow_html=True)
             st.write("📊 **Document Status:**")
-            st.write(f"- Documents: {st.session_state.get('document_count', 0)}")
-            st.write(f"- Chunks: {len(st.session_state.get('chunks', []))}")
+            st.write(f"- Documents: {corpus.document_count}")
+            st.write(f"- Chunks: {len(corpus.chunks)}")
             st.write("- Status: ✅ Ready")
             st.markdown('</div>', unsafe_allow_html=True)
         
@@ -230,24 +271,23 @@ def main():
         search_button = st.button("🔍 Search", type="primary", disabled=not (api_token and query))
         
         if search_button and api_token and query:
-            # Load documents if not already loaded
-            if 'chunks_loaded' not in st.session_state:
-                chunks = rag.load_documents()
-                if not chunks:
-                    st.stop()
-            else:
-                rag.chunks = st.session_state.chunks
+            # Load documents if not already loaded; search and render from this one snapshot
+            corpus = rag.load_documents(api_token)
+            if not corpus.chunks:
+                st.stop()
             
             # Search for similar chunks
             with st.spinner("🔍 Searching for relevant information..."):
-                similar_chunks = rag.search_similar_chunks(query, api_token, top_k)
+                top_indices, scores = rag.search_similar_chunks(corpus, query, api_token, top_k)
             
-            if similar_chunks:
+            if len(top_indices):
                 # Filter by minimum similarity
-                filtered_chunks = [(chunk, score) for chunk, score in similar_chunks if score >= min_similarity]
+                above_threshold = scores >= min_similarity
+                top_indices, scores = top_indices[above_threshold], scores[above_threshold]
+                filenames = corpus.chunk_filenames[top_indices]
                 
-                if filtered_chunks:
-                    st.success(f"✅ Found {len(filtered_chunks)} relevant results!")
+                if len(top_indices):
+                    st.success(f"✅ Found {len(top_indices)} relevant results!")
                     
                     # Generate answer
                     st.markdown('<div class="answer-box">', unsafe_allow_html=True)
@@ -255,8 +295,8 @@ def main():
                     
                     # Create response from top chunks
                     answer_parts = []
-                    for i, (chunk, score) in enumerate(filtered_chunks[:3], 1):
-                        answer_parts.append(f"**{i}.** {chunk['content'][:300]}... *[From: {chunk['filename']}]*")
+                    for i, (idx, filename) in enumerate(zip(top_indices[:3], filenames[:3]), 1):
+                        answer_parts.append(f"**{i}.** {corpus.chunk_texts[idx][:300]}... *[From: {filename}]*")
                     
                     st.markdown("\n\n".join(answer_parts))
                     st.markdown('</div>', unsafe_allow_html=True)
@@ -264,13 +304,13 @@ def main():
                     # Show detailed results
                     st.markdown("### 🔍 **Detailed Search Results:**")
                     
-                    for i, (chunk, score) in enumerate(filtered_chunks, 1):
-                        with st.expander(f"Result {i}: {chunk['filename']} (Similarity: {score:.3f})"):
+                    for i, (idx, filename, score) in enumerate(zip(top_indices, filenames, scores), 1):
+                        with st.expander(f"Result {i}: {filename} (Similarity: {score:.3f})"):
                             st.markdown(f'<div class="source-box">', unsafe_allow_html=True)
-                            st.markdown(f"**📁 Source:** `{chunk['filename']}`")
+                            st.markdown(f"**📁 Source:** `{filename}`")
                             st.markdown(f"**📊 Similarity Score:** <span class='similarity-score'>{score:.3f}</span>", unsafe_allow_html=True)
                             st.markdown(f"**📄 Content:**")
-                            st.write(chunk['content'])
+                            st.write(corpus.chunk_texts[idx])
                             st.markdown('</div>', unsafe_allow_html=True)
                     
                     # Save to session state for history
@@ -279,8 +319,8 @@ def main():
                     
                     st.session_state.search_history.append({
                         'query': query,
-                        'results_count': len(filtered_chunks),
-                        'top_score': filtered_chunks[0][1] if filtered_chunks else 0
+                        'results_count': len(top_indices),
+                        'top_score': float(scores[0])
                     })
                     
                 else:
@@ -294,8 +334,9 @@ def main():
         
         if 'chunks_loaded' in st.session_state:
             # Document statistics
-            st.metric("Documents Loaded", st.session_state.get('document_count', 0))
-            st.metric("Text Chunks", len(st.session_state.get('chunks', [])))
+            corpus = rag.corpus
+            st.metric("Documents Loaded", corpus.document_count)
+            st.metric("Text Chunks", len(corpus.chunks))
             
             # Search history
             if 'search_history' in st.session_state and st.session_state.search_history:
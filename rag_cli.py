@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
 
 import sys
+import numpy as np
 sys.path.append('src')
 
 from data_loader import DataLoader
 from text_chunker import TextChunker
-from config.config import RAW_DATA_DIR
-import requests
+from retrieval import HuggingFaceEncoder, LocalEncoder, VectorIndex, local_encoder_available, corpus_cache_key, load_corpus_cache, save_corpus_cache
+from config.config import RAW_DATA_DIR, VECTOR_DB_DIR, MODEL_CACHE_DIR
 import json
 import time
-from typing import List, Dict, Tuple
+from typing import List, Dict
 
 class InteractiveRAG:
     """Interactive command-line RAG system"""
@@ -17,16 +18,42 @@ class InteractiveRAG:
     def __init__(self, api_token: str):
         self.api_token = api_token
         self.model = "sentence-transformers/all-MiniLM-L6-v2"
-        self.api_url = f"https://api-inference.huggingface.co/models/{self.model}"
-        self.headers = {"Authorization": f"Bearer {api_token}"}
+        
+        # Embed in-process when ONNX Runtime is installed, otherwise through the Inference API
+        if local_encoder_available():
+            self.encoder = LocalEncoder(MODEL_CACHE_DIR, self.model)
+        else:
+            self.encoder = HuggingFaceEncoder(api_token, self.model)
+        
+        self.chunk_size = 600
+        self.chunk_overlap = 100
         self.chunks = []
+        self.chunk_texts = []
+        self.chunk_filenames = np.empty(0, dtype=object)
+        self.index = None
         self.loaded = False
         
+    def _set_chunks(self, chunks: List[Dict]):
+        """Keep chunks alongside column arrays so results can be gathered by index"""
+        self.chunks = chunks
+        self.chunk_texts = [chunk['content'] for chunk in chunks]
+        self.chunk_filenames = np.array([chunk['filename'] for chunk in chunks], dtype=object)
+    
     def load_documents(self):
         """Load and process documents"""
         if self.loaded:
             return True
             
+        # Reuse the processed corpus if no document has changed since the last run
+        cache_key = corpus_cache_key(RAW_DATA_DIR, self.model, self.chunk_size, self.chunk_overlap)
+        cached = load_corpus_cache(VECTOR_DB_DIR, cache_key)
+        if cached:
+            chunks, document_count, self.index = cached
+            self._set_chunks(chunks)
+            print(f"✅ Loaded {document_count} documents, {len(self.chunks)} chunks from cache")
+            self.loaded = True
+            return True
+        
         print("📄 Loading documents...")
         loader = DataLoader(RAW_DATA_DIR)
         documents = loader.load_documents_from_directory()
@@ -36,9 +63,19 @@ class InteractiveRAG:
             return False
         
         print("🔗 Chunking documents...")
-        chunker = TextChunker(chunk_size=600, chunk_overlap=100)
+        chunker = TextChunker(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
         chunks = chunker.process_documents(documents, "recursive")
-        self.chunks = chunker.validate_chunks(chunks)
+        self._set_chunks(chunker.validate_chunks(chunks))
+        
+        # Embed every chunk once so each query only has to embed itself
+        print("🧠 Embedding chunks...")
+        try:
+            self.index = VectorIndex(self.encoder.encode(self.chunk_texts))
+        except Exception as e:
+            print(f"💥 Error embedding documents: {e}")
+            return False
+        
+        save_corpus_cache(VECTOR_DB_DIR, cache_key, self.chunks, len(documents), self.index)
         
         print(f"✅ Loaded {len(documents)} documents, created {len(self.chunks)} chunks")
         self.loaded = True
@@ -53,73 +90,51 @@ class InteractiveRAG:
         print(f"\n🔍 Searching for: '{query}'")
         print("⏳ Please wait...")
         
-        # Prepare API call
-        chunk_texts = [chunk['content'] for chunk in self.chunks]
-        payload = {
-            "inputs": {
-                "source_sentence": query,
-                "sentences": chunk_texts
-            }
-        }
-        
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                similarities = response.json()
-                
-                # Pair and sort results
-                chunk_similarity_pairs = list(zip(self.chunks, similarities))
-                chunk_similarity_pairs.sort(key=lambda x: x[1], reverse=True)
-                
-                # Display results
-                top_results = chunk_similarity_pairs[:top_k]
-                self.display_results(query, top_results)
-                return True
-                
-            elif response.status_code == 503:
-                print("⏳ Model is loading. Please wait and try again.")
-                return False
-            else:
-                print(f"❌ API Error: {response.status_code} - {response.text}")
-                return False
-                
+            query_embedding = self.encoder.encode_query(query)
         except Exception as e:
             print(f"💥 Error: {e}")
             return False
+        
+        top_indices, scores = self.index.search(query_embedding, top_k)
+        
+        # Display results
+        self.display_results(query, top_indices, scores)
+        return True
     
-    def display_results(self, query: str, results: List[Tuple[Dict, float]]):
+    def display_results(self, query: str, top_indices: np.ndarray, scores: np.ndarray):
         """Display search results in a formatted way"""
         print(f"\n{'='*60}")
         print(f"🤔 Question: {query}")
         print(f"{'='*60}")
         
         # Filter results with decent similarity
-        good_results = [(chunk, score) for chunk, score in results if score > 0.3]
+        good = scores > 0.3
+        good_indices, good_scores = top_indices[good], scores[good]
         
-        if good_results:
-            print(f"\n📝 Answer based on {len(good_results)} relevant sources:")
+        if len(good_indices):
+            print(f"\n📝 Answer based on {len(good_indices)} relevant sources:")
             print("-" * 60)
             
-            for i, (chunk, score) in enumerate(good_results[:3], 1):
-                print(f"\n{i}. From '{chunk['filename']}' (Similarity: {score:.3f}):")
-                print(f"   {chunk['content'][:300]}...")
+            for rank, (i, score) in enumerate(zip(good_indices[:3].tolist(), good_scores[:3].tolist()), 1):
+                print(f"\n{rank}. From '{self.chunk_filenames[i]}' (Similarity: {score:.3f}):")
+                print(f"   {self.chunk_texts[i][:300]}...")
             
             print(f"\n{'─'*60}")
             print("📊 All Search Results:")
             
-            for i, (chunk, score) in enumerate(results, 1):
+            for rank, (i, score) in enumerate(zip(top_indices.tolist(), scores.tolist()), 1):
                 status = "✅" if score > 0.3 else "⚠️" if score > 0.2 else "❌"
-                print(f"   {i}. {status} {score:.3f} | {chunk['filename'][:30]} | {chunk['content'][:50]}...")
+                print(f"   {rank}. {status} {score:.3f} | {self.chunk_filenames[i][:30]} | {self.chunk_texts[i][:50]}...")
         else:
             print("\n❌ No highly relevant results found.")
             print("💡 Try rephrasing your question or asking about different topics.")
             
             # Show top results anyway
-            print(f"\n🔍 Top {min(3, len(results))} results (lower relevance):")
-            for i, (chunk, score) in enumerate(results[:3], 1):
-                print(f"   {i}. Score: {score:.3f} | {chunk['filename']}")
-                print(f"      {chunk['content'][:100]}...")
+            print(f"\n🔍 Top {min(3, len(top_indices))} results (lower relevance):")
+            for rank, (i, score) in enumerate(zip(top_indices[:3].tolist(), scores[:3].tolist()), 1):
+                print(f"   {rank}. Score: {score:.3f} | {self.chunk_filenames[i]}")
+                print(f"      {self.chunk_texts[i][:100]}...")
     
     def run_interactive(self):
         """Run interactive command-line interface"""
@@ -200,10 +215,9 @@ class InteractiveRAG:
         print(f"Documents loaded: {self.loaded}")
         if self.loaded:
             print(f"Total chunks: {len(self.chunks)}")
-            filenames = list(set(chunk['filename'] for chunk in self.chunks))
+            filenames, chunk_counts = np.unique(self.chunk_filenames, return_counts=True)
             print(f"Source files: {len(filenames)}")
-            for filename in filenames[:5]:  # Show first 5 files
-                chunk_count = sum(1 for chunk in self.chunks if chunk['filename'] == filename)
+            for filename, chunk_count in zip(filenames[:5], chunk_counts[:5]):  # Show first 5 files
                 print(f"  • {filename}: {chunk_count} chunks")
             if len(filenames) > 5:
                 print(f"  • ... and {len(filenames) - 5} more files")
@@ -0,0 +1,31 @@
+"""Compiled similarity kernels, used when numba is installed"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # Callers fall back to NumPy
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+
+    # Serial on purpose: Streamlit sessions call this from concurrent threads, and numba's
+    # default workqueue threading layer aborts the process on concurrent parallel calls
+    @njit(fastmath=True, cache=True)
+    def _int8_scores(codes, scales, query, out):
+        for i in range(codes.shape[0]):
+            acc = np.float32(0.0)
+            for k in range(codes.shape[1]):
+                acc += codes[i, k] * query[k]
+            out[i] = acc * scales[i]
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Score a query against int8 codes with per-row scales: (codes @ query) * scales"""
+    if not NUMBA_AVAILABLE:
+        return (codes @ query) * scales
+
+    # Reads the int8 rows directly instead of materializing a float32 copy of the matrix
+    out = np.empty(codes.shape[0], dtype=np.float32)
+    _int8_scores(codes, scales, np.ascontiguousarray(query, dtype=np.float32), out)
+    return out
@@ -1,12 +1,31 @@
 import os
-import PyPDF2
+import pypdf
 import docx
 import requests
 from bs4 import BeautifulSoup
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
 import re
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_KEPT_PUNCTUATION = set('_.,!?;:-()')
+
+class _SpecialCharTable(dict):
+    """str.translate table mapping special characters to spaces, filled in as characters are seen"""
+    
+    def __missing__(self, codepoint: int) -> int:
+        char = chr(codepoint)
+        keep = char.isalnum() or char.isspace() or char in _KEPT_PUNCTUATION
+        self[codepoint] = codepoint if keep else ord(' ')
+        return self[codepoint]
+
+_SPECIAL_CHARS = _SpecialCharTable()
+
+# Files are parsed in-process unless the files other than the largest hold at least this many
+# bytes; the pool can't finish before its largest file does, and PDFs parse at a few MB/s
+PARALLEL_MIN_BYTES = 8_000_000
+
 class DataLoader:
     """Handles loading and preprocessing of various document formats"""
     
@@ -17,11 +36,12 @@ class DataLoader:
         """Extract text from PDF files"""
         try:
             with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
+                pdf_reader = pypdf.PdfReader(file)
+                parts = []
                 for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                    parts.append(page.extract_text() or "")
+                    parts.append("\n")
+                return "".join(parts)
         except Exception as e:
             print(f"Error loading PDF {file_path}: {e}")
             return ""
@@ -30,10 +50,7 @@ class DataLoader:
         """Extract text from Word documents"""
         try:
             doc = docx.Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs if paragraph.text)
         except Exception as e:
             print(f"Error loading DOCX {file_path}: {e}")
             return ""
@@ -51,67 +68,75 @@ class DataLoader:
         """Scrape text from web pages"""
         try:
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
+            with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                
+                # Parse straight from the socket; decode_content undoes any gzip/deflate encoding
+                response.raw.decode_content = True
+                soup = BeautifulSoup(response.raw, 'lxml')
             
             # Remove script and style elements
             for script in soup(["script", "style"]):
                 script.decompose()
             
-            # Get text and clean it
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            return text
+            # Get text with whitespace already stripped; clean_text handles the rest
+            return soup.get_text(' ', strip=True)
         except Exception as e:
             print(f"Error loading webpage {url}: {e}")
             return ""
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
         # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)]', ' ', text)
+        text = text.translate(_SPECIAL_CHARS)
+        
+        # Remove extra whitespace
+        text = _WHITESPACE_RE.sub(' ', text)
         
         # Remove very short lines
-        lines = text.split('\n')
-        lines = [line.strip() for line in lines if len(line.strip()) > 10]
+        lines = (line.strip() for line in text.split('\n'))
         
-        return '\n'.join(lines).strip()
+        return '\n'.join(line for line in lines if len(line) > 10).strip()
+    
+    def load_file(self, file_path: Path) -> Optional[Dict]:
+        """Load and clean a single document, returning None if it has no usable text"""
+        text = ""
+        file_ext = file_path.suffix.lower()
+        
+        if file_ext == '.pdf':
+            text = self.load_pdf(str(file_path))
+        elif file_ext == '.docx':
+            text = self.load_docx(str(file_path))
+        elif file_ext == '.txt':
+            text = self.load_txt(str(file_path))
+        
+        if text:
+            cleaned_text = self.clean_text(text)
+            if cleaned_text:
+                return {
+                    'content': cleaned_text,
+                    'source': str(file_path),
+                    'filename': file_path.name,
+                    'file_type': file_ext
+                }
+        
+        return None
     
     def load_documents_from_directory(self) -> List[Dict]:
         """Load all documents from the raw data directory"""
-        documents = []
+        file_paths = [file_path for file_path in self.raw_data_dir.rglob('*') if file_path.is_file()]
         
-        for file_path in self.raw_data_dir.rglob('*'):
-            if file_path.is_file():
-                text = ""
-                file_ext = file_path.suffix.lower()
-                
-                if file_ext == '.pdf':
-                    text = self.load_pdf(str(file_path))
-                elif file_ext == '.docx':
-                    text = self.load_docx(str(file_path))
-                elif file_ext == '.txt':
-                    text = self.load_txt(str(file_path))
-                
-                if text:
-                    cleaned_text = self.clean_text(text)
-                    if cleaned_text:
-                        documents.append({
-                            'content': cleaned_text,
-                            'source': str(file_path),
-                            'filename': file_path.name,
-                            'file_type': file_ext
-                        })
+        # Parsing is CPU-bound, so spread files across processes when enough of it can overlap
+        sizes = [file_path.stat().st_size for file_path in file_paths]
+        if len(file_paths) > 1 and sum(sizes) - max(sizes) >= PARALLEL_MIN_BYTES:
+            max_workers = min(os.cpu_count() or 1, len(file_paths))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                # One file per task, since files are few and vary widely in parsing cost
+                results = list(executor.map(self.load_file, file_paths, chunksize=1))
+        else:
+            results = [self.load_file(file_path) for file_path in file_paths]
         
-        return documents
+        return [document for document in results if document]
     
     def load_from_urls(self, urls: List[str]) -> List[Dict]:
         """Load documents from a list of URLs"""
@@ -1,85 +1,190 @@
 import requests
+from requests.adapters import HTTPAdapter
+import hashlib
 import json
+import random
 import time
 import numpy as np
-from typing import List, Dict, Optional
-import pickle
+from typing import List, Dict, Optional, Tuple, Union
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from _kernels import int8_scores
+
+try:
+    import faiss
+except ImportError:  # Fall back to exact search
+    faiss = None
+
+try:
+    import orjson
+except ImportError:  # Parse API responses with the standard library instead
+    orjson = None
+
+RATE_LIMIT_RETRIES = 5  # Attempts on 429, which needs longer than other errors to clear
+RATE_LIMIT_BASE_DELAY = 15.0
+MAX_RETRY_AFTER = 120.0  # Longest Retry-After honored, so a bad header can't stall a batch
+
+def parse_json_response(response: requests.Response):
+    """Decode a JSON response body, in C with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
 
 class HuggingFaceEmbeddings:
     """Generate embeddings using HuggingFace Inference API (Free)"""
     
-    def __init__(self, api_token: str, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, api_token: str, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", cache_dir: Optional[Path] = None):
         self.api_token = api_token
         self.model_name = model_name
-        self.api_url = f"https://api-inference.huggingface.co/models/{model_name}"
+        self.api_url = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{model_name}"
         self.headers = {"Authorization": f"Bearer {api_token}"}
         
-    def generate_single_embedding(self, text: str, max_retries: int = 3) -> Optional[List[float]]:
-        """Generate embedding for a single text"""
-        payload = {"inputs": text}
+        # Keep TLS connections alive across calls; retries stay in generate_single_embedding
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=0))
         
-        for attempt in range(max_retries):
+        # Embeddings already fetched for a text are reused from here instead of the API
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _cache_path(self, text: str) -> Path:
+        """Content-addressed cache file for a text's embedding under this model"""
+        key = hashlib.blake2b(f"{self.model_name}\0{text}".encode('utf-8'), digest_size=16).hexdigest()
+        return self.cache_dir / f"{key}.npy"
+    
+    def _load_cached(self, text: str) -> Optional[List[float]]:
+        """Cached embedding for text, or None if caching is off or it was never fetched"""
+        if self.cache_dir is None:
+            return None
+        path = self._cache_path(text)
+        return np.load(path).tolist() if path.exists() else None
+        
+    def generate_single_embedding(self, inputs: Union[str, List[str]], max_retries: int = 3) -> Optional[List]:
+        """Generate the embedding of one text, or one embedding per text for a list of texts"""
+        payload = {"inputs": inputs, "options": {"wait_for_model": True}}
+        
+        for attempt in range(max(max_retries, RATE_LIMIT_RETRIES)):
             try:
-                response = requests.post(self.api_url, headers=self.headers, json=payload, timeout=30)
+                response = self.session.post(self.api_url, json=payload, timeout=30)
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    if isinstance(result, list) and len(result) > 0:
+                    result = parse_json_response(response)
+                    if isinstance(inputs, str) and isinstance(result, list) and len(result) > 0:
                         return result[0] if isinstance(result[0], list) else result
                     return result
                     
                 elif response.status_code == 503:
-                    # Model is loading, wait and retry
-                    print(f"⏳ Model loading, waiting 20 seconds... (attempt {attempt + 1})")
-                    time.sleep(20)
-                    continue
+                    # Model is loading, back off and retry
+                    if attempt >= max_retries - 1:
+                        break
+                    delay = self._backoff_delay(attempt)
+                    print(f"⏳ Model loading, waiting {delay:.0f} seconds... (attempt {attempt + 1})")
                     
                 elif response.status_code == 429:
-                    # Rate limit, wait and retry
-                    print(f"⚠️ Rate limit hit, waiting 60 seconds... (attempt {attempt + 1})")
-                    time.sleep(60)
-                    continue
+                    # Rate limit, wait past what the server asks and at least a jittered backoff
+                    if attempt >= max(max_retries, RATE_LIMIT_RETRIES) - 1:
+                        break
+                    retry_after = self._retry_after(response) + random.uniform(0, RATE_LIMIT_BASE_DELAY / 2)
+                    delay = max(retry_after, self._backoff_delay(attempt, base=RATE_LIMIT_BASE_DELAY))
+                    print(f"⚠️ Rate limit hit, waiting {delay:.0f} seconds... (attempt {attempt + 1})")
                     
                 else:
                     print(f"❌ Error {response.status_code}: {response.text}")
                     return None
                     
-            except requests.exceptions.RequestException as e:
-                print(f"🔄 Network error (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(5)
-                continue
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # ValueError covers a 200 with a non-JSON body, which orjson reports outside RequestException
+                print(f"🔄 Request error (attempt {attempt + 1}): {e}")
+                if attempt >= max_retries - 1:
+                    break
+                delay = self._backoff_delay(attempt)
+            
+            time.sleep(delay)
                 
         return None
     
-    def generate_embeddings_batch(self, texts: List[str], batch_size: int = 1) -> List[Optional[List[float]]]:
-        """Generate embeddings for multiple texts with rate limiting"""
-        embeddings = []
+    @staticmethod
+    def _backoff_delay(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+        """Exponential backoff for retry number `attempt` (0-based), capped at `cap` seconds
+        
+        Half the delay is random so concurrent workers that failed together don't retry in lockstep.
+        """
+        delay = min(cap, base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        """Seconds the server asked to wait in its Retry-After header, or 0 if it didn't say"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return 0.0
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return 0.0
+        return min(MAX_RETRY_AFTER, max(0.0, seconds))
+    
+    def generate_embeddings_batch(self, texts: List[str], batch_size: int = 32, max_workers: int = 8) -> List[Optional[List[float]]]:
+        """Generate embeddings for multiple texts, batch_size texts per request and up to max_workers requests in flight"""
+        embeddings = [self._load_cached(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
         
-        print(f"🚀 Generating embeddings for {len(texts)} texts...")
+        print(f"🚀 Generating embeddings for {len(texts)} texts ({len(texts) - len(missing)} cached)...")
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            
-            for j, text in enumerate(batch):
-                print(f"📝 Processing {i + j + 1}/{len(texts)}: {text[:50]}...")
-                
-                embedding = self.generate_single_embedding(text)
-                embeddings.append(embedding)
-                
-                # Rate limiting - wait between requests
-                if i + j < len(texts) - 1:  # Don't wait after the last request
-                    time.sleep(1)  # 1 second between requests to be safe
-                    
-            print(f"✅ Completed batch {i//batch_size + 1}")
+        # Requests are network-bound, so overlap them; 429/503 responses back off per request
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            batch_texts = ([texts[j] for j in batch] for batch in batches)
+            for i, (batch, result) in enumerate(zip(batches, executor.map(self.generate_single_embedding, batch_texts)), 1):
+                # A failed batch leaves its positions None so results stay aligned with texts
+                if result is not None and len(result) == len(batch):
+                    for j, embedding in zip(batch, result):
+                        embeddings[j] = embedding
+                        if self.cache_dir is not None:
+                            np.save(self._cache_path(texts[j]), np.asarray(embedding, dtype=np.float32))
+                print(f"✅ Completed batch {i}")
             
         successful = sum(1 for e in embeddings if e is not None)
         print(f"🎯 Successfully generated {successful}/{len(texts)} embeddings")
         
         return embeddings
 
+def quantize_rows(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with one scale per row"""
+    scales = np.max(np.abs(embeddings), axis=1, initial=0.0) / 127
+    scales[scales == 0] = 1.0
+    codes = np.round(embeddings / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def top_k_indices(sims: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first"""
+    n = len(sims)
+    top_k = min(top_k, n)
+    if top_k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Partition the best top_k to the end in O(N) without allocating a negated copy of sims
+    if top_k < n:
+        idx = np.argpartition(sims, n - top_k)[n - top_k:]
+    else:
+        idx = np.arange(n)
+
+    return idx[np.argsort(sims[idx])[::-1]]
+
+ANN_SEARCH_THRESHOLD = 10_000  # Stores above this many unit rows use an HNSW graph when faiss is installed
+HNSW_M = 32
+HNSW_EF_SEARCH = 128
+INT8_SEARCH_THRESHOLD = 100_000  # Stores above this many unit rows are scored from int8 codes
+
 class SimpleVectorStore:
     """Simple in-memory vector store for testing"""
     
@@ -87,74 +192,152 @@ class SimpleVectorStore:
         self.embeddings = []
         self.metadata = []
         self.storage_path = storage_path
+        self._matrix = None  # Stacked copy of embeddings, rebuilt lazily
+        self._scales = None  # Per-row scales when _matrix holds int8 codes
+        self._index = None  # FAISS HNSW index over the rows, built lazily for large stores
         
     def add_documents(self, chunks: List[Dict], embeddings: List[List[float]]):
         """Add chunks and their embeddings to the store"""
+        start = len(self.embeddings)
         for chunk, embedding in zip(chunks, embeddings):
             if embedding is not None:  # Only add successful embeddings
-                self.embeddings.append(embedding)
+                # Normalize once here so search only needs a dot product per row
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm > 0:
+                    vector = vector / norm
+                self.embeddings.append(vector)
                 self.metadata.append(chunk)
         
+        self._matrix = None
+        self._scales = None
+        if self._index is not None:
+            # The HNSW graph grows in place, so only the new rows are inserted
+            if len(self.embeddings) > start:
+                self._index.add(np.asarray(self.embeddings[start:], dtype=np.float32))
+        elif self._uses_ann():
+            # Build here rather than on the first query
+            self._get_index()
+        
         print(f"📚 Added {len(self.embeddings)} documents to vector store")
     
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
-        try:
-            vec1 = np.array(vec1)
-            vec2 = np.array(vec2)
-            
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-                
-            return dot_product / (norm1 * norm2)
-        except:
+        a = np.asarray(vec1, dtype=np.float32)
+        b = np.asarray(vec2, dtype=np.float32)
+        
+        denom = np.sqrt(np.vdot(a, a) * np.vdot(b, b))
+        if denom == 0:
             return 0.0
+        
+        return float(np.vdot(a, b) / denom)
+    
+    def _uses_ann(self) -> bool:
+        """Past a few thousand rows an HNSW graph answers in far fewer dot products than a full scan"""
+        return faiss is not None and len(self.embeddings) > ANN_SEARCH_THRESHOLD
+    
+    def _get_index(self):
+        """Build the HNSW index over the unit rows once; add_documents extends it in place"""
+        if self._index is None:
+            vectors = np.asarray(self.embeddings, dtype=np.float32)
+            self._index = faiss.IndexHNSWFlat(vectors.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self._index.add(vectors)
+        return self._index
+    
+    def _uses_int8(self) -> bool:
+        """Large stores of unit rows are searched from int8 codes, a quarter of float32's bytes"""
+        return len(self.embeddings) > INT8_SEARCH_THRESHOLD
+    
+    def _get_matrix(self) -> np.ndarray:
+        """Stack embeddings into one float32 matrix of unit rows, rebuilt only after changes
+        
+        Large stores are quantized to int8 codes with per-row scales instead.
+        """
+        if self._matrix is None:
+            if self._uses_int8():
+                self._matrix, self._scales = quantize_rows(np.asarray(self.embeddings, dtype=np.float32))
+            else:
+                self._matrix = np.asarray(self.embeddings, dtype=np.float32)
+        return self._matrix
+    
+    def _exact_scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every stored row"""
+        matrix = self._get_matrix()
+        
+        # One matrix-vector product scores every document against the query
+        query /= np.linalg.norm(query) or 1.0
+        if self._scales is not None:
+            return int8_scores(matrix, self._scales, query)
+        return matrix @ query
     
     def search(self, query_embedding: List[float], top_k: int = 5) -> List[Dict]:
         """Search for most similar documents"""
-        if not self.embeddings:
+        if not self.embeddings or top_k <= 0:
             return []
         
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = self.cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((similarity, i))
+        # Copy, since the query is normalized in place and may be a caller's (or a cache's) array
+        query = np.array(query_embedding, dtype=np.float32)
         
-        # Sort by similarity (highest first)
-        similarities.sort(reverse=True)
+        if self._uses_ann():
+            # Rows are unit-length, so inner product on the normalized query is cosine similarity
+            query /= np.linalg.norm(query) or 1.0
+            index = self._get_index()
+            index.hnsw.efSearch = max(HNSW_EF_SEARCH, top_k)
+            scores, indices = index.search(query[None, :], min(top_k, index.ntotal))
+            found = indices[0] >= 0
+            top_indices, top_scores = indices[0][found], scores[0][found]
+        else:
+            similarities = self._exact_scores(query)
+            top_indices = top_k_indices(similarities, top_k)
+            top_scores = similarities[top_indices]
         
         results = []
-        for similarity, idx in similarities[:top_k]:
+        for idx, score in zip(top_indices.tolist(), top_scores.tolist()):
             result = self.metadata[idx].copy()
-            result['similarity_score'] = similarity
+            result['similarity_score'] = score
             results.append(result)
         
         return results
     
     def save(self, filepath: Path):
-        """Save vector store to disk"""
-        data = {
-            'embeddings': self.embeddings,
-            'metadata': self.metadata
-        }
+        """Save vector store to disk: embeddings as one .npy file, metadata as JSON"""
+        filepath = Path(filepath)
+        matrix_path = filepath.with_suffix('.npy')
+        
+        # Write the consolidated matrix's buffer as-is when it already has the on-disk dtype
+        if self._matrix is not None and self._matrix.dtype == np.float32:
+            matrix = self._matrix
+        else:
+            matrix = np.asarray(self.embeddings, dtype=np.float32)
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(data, f)
+        # Replace rather than truncate, since the current file may be memory-mapped by this store
+        tmp_path = matrix_path.with_name(matrix_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_path, matrix_path)
+        
+        with open(filepath.with_suffix('.json'), 'w', encoding='utf-8') as f:
+            json.dump({'metadata': self.metadata}, f)
         
         print(f"💾 Vector store saved to {filepath}")
     
     def load(self, filepath: Path):
-        """Load vector store from disk"""
-        if filepath.exists():
-            with open(filepath, 'rb') as f:
-                data = pickle.load(f)
+        """Load vector store from disk, memory-mapping the embeddings instead of reading them in"""
+        filepath = Path(filepath)
+        matrix_path = filepath.with_suffix('.npy')
+        metadata_path = filepath.with_suffix('.json')
+        
+        if matrix_path.exists() and metadata_path.exists():
+            matrix = np.load(matrix_path, mmap_mode='r')
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
             
-            self.embeddings = data['embeddings']
+            # Rows are views into the mapping, which is searched in place unless it is quantized to int8
             self.metadata = data['metadata']
+            self.embeddings = list(matrix)
+            self._scales = None
+            self._index = None
+            self._matrix = matrix if not self._uses_int8() else None
             
             print(f"📁 Vector store loaded from {filepath}")
             print(f"📊 Loaded {len(self.embeddings)} embeddings")
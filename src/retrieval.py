@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import platform
+import zipfile
+import numpy as np
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+from _kernels import int8_scores
+from embedding_generator import HuggingFaceEmbeddings, quantize_rows, top_k_indices
+
+try:
+    import faiss
+except ImportError:  # Fall back to exact search over the int8 codes
+    faiss = None
+
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+except ImportError:  # Embed through the Inference API instead
+    ORTModelForFeatureExtraction = None
+
+# Corpora larger than this get a compressed IVF-PQ index instead of an exact one
+IVF_PQ_THRESHOLD = 100_000
+
+# MiniLM reads at most 256 word pieces; no natural text needs more characters than this to fill them
+MAX_EMBED_CHARS = 2048
+
+# Bump when the corpus cache layout changes so stale files are ignored
+CORPUS_CACHE_VERSION = 4
+
+
+class HuggingFaceEncoder:
+    """Embed texts through the HuggingFace Inference API with a HuggingFaceEmbeddings client"""
+
+    def __init__(self, api_token: str, model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 batch_size: int = 32, max_workers: int = 8):
+        self.api_token = api_token
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.client = HuggingFaceEmbeddings(api_token, model_name)
+
+        # Memoize repeated queries per instance, so a replaced encoder is freed with its cache
+        self.encode_query = lru_cache(maxsize=1024)(self._encode_query)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in parallel batches and return L2-normalized rows in input order"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # Send texts of similar length together so each request carries little padding
+        order = length_order(texts)
+        embeddings = self.client.generate_embeddings_batch(
+            [texts[i][:MAX_EMBED_CHARS] for i in order], batch_size=self.batch_size, max_workers=self.max_workers
+        )
+
+        failed = sum(1 for embedding in embeddings if embedding is None)
+        if failed:
+            raise RuntimeError(f"API Error: {failed} of {len(texts)} texts could not be embedded")
+
+        vecs = np.empty((len(texts), len(embeddings[0])), dtype=np.float32)
+        vecs[order] = embeddings
+        return normalize_rows(vecs)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Embed a single query string"""
+        return self.encode([query])[0]
+
+class LocalEncoder:
+    """Embed texts in-process with a dynamically int8-quantized ONNX export of the model"""
+
+    def __init__(self, model_dir: Path, model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 batch_size: int = 128, max_length: int = 256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        quantized_dir = Path(model_dir) / model_name.replace('/', '__')
+        if not (quantized_dir / "model_quantized.onnx").exists():
+            self._export_quantized(quantized_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            quantized_dir, file_name="model_quantized.onnx", provider="CPUExecutionProvider"
+        )
+
+        # Memoize repeated queries per instance, so a replaced encoder is freed with its cache
+        self.encode_query = lru_cache(maxsize=1024)(self._encode_query)
+
+    def _export_quantized(self, save_dir: Path):
+        """Export the model to ONNX once and quantize its weights to int8"""
+        model = ORTModelForFeatureExtraction.from_pretrained(self.model_name, export=True)
+        if platform.machine().lower() in ('arm64', 'aarch64'):
+            qconfig = AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+        else:
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+        ORTQuantizer.from_pretrained(model).quantize(save_dir=save_dir, quantization_config=qconfig)
+        AutoTokenizer.from_pretrained(self.model_name).save_pretrained(save_dir)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts and return L2-normalized rows in input order"""
+        vecs = np.empty((0, 0), dtype=np.float32)
+        for batch in length_sorted_batches(texts, self.batch_size):
+            inputs = self.tokenizer([texts[i][:MAX_EMBED_CHARS] for i in batch], padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors='np')
+            hidden = self.model(**inputs).last_hidden_state
+
+            # Mean-pool over real tokens, as the sentence-transformers pooling layer does
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+            if not vecs.size:
+                vecs = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            vecs[batch] = pooled
+
+        return normalize_rows(vecs)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Embed a single query string"""
+        return self.encode([query])[0]
+
+class VectorIndex:
+    """Inner-product index over L2-normalized embeddings, backed by FAISS when installed
+
+    Embeddings are held as int8 codes with one float32 scale per row, a quarter of
+    the float32 footprint. Per-row scaling keeps the rounding error under half a
+    step of each row's largest component, which leaves top-k rankings intact.
+    """
+
+    def __init__(self, embeddings: np.ndarray, index=None, scales: Optional[np.ndarray] = None):
+        if scales is None:
+            self.codes, self.scales = quantize_rows(np.asarray(embeddings, dtype=np.float32))
+        else:
+            self.codes, self.scales = embeddings, scales
+        self.index = index
+        if self.index is None and faiss is not None and len(self.codes):
+            self.index = self._build_faiss_index(self.embeddings)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Dequantized float32 embeddings"""
+        return self.codes * self.scales[:, None]
+
+    @staticmethod
+    def _build_faiss_index(embeddings: np.ndarray):
+        """8-bit scalar-quantized index for small corpora, 4-bit PQ FastScan for large ones"""
+        dim = embeddings.shape[1]
+
+        if len(embeddings) > IVF_PQ_THRESHOLD:
+            index = faiss.index_factory(dim, "IVF4096,PQ32x4fsr", faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+            index.nprobe = 16
+        else:
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+
+        index.add(embeddings)
+        return index
+
+    def save(self, filepath: Path):
+        """Persist the FAISS index to disk, replacing any existing file in one step"""
+        if self.index is not None:
+            tmp_path = _tmp_path(Path(filepath))
+            faiss.write_index(self.index, str(tmp_path))
+            os.replace(tmp_path, filepath)
+
+    @classmethod
+    def load(cls, codes: np.ndarray, scales: np.ndarray, filepath: Path) -> 'VectorIndex':
+        """Wrap quantized embeddings with a previously saved FAISS index, rebuilding it if missing
+
+        The index is memory-mapped read-only, so pages are loaded on demand and shared
+        between processes serving the same corpus.
+        """
+        index = None
+        if faiss is not None and Path(filepath).exists():
+            # IO_FLAG_MMAP maps IVF inverted lists; IO_FLAG_MMAP_IFC (faiss >= 1.10) maps flat codes too
+            io_flags = faiss.IO_FLAG_MMAP | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0) | faiss.IO_FLAG_READ_ONLY
+            index = faiss.read_index(str(filepath), io_flags)
+        return cls(codes, index, scales)
+
+    def search(self, query_embedding: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, scores) of the top_k most similar embeddings, best first"""
+        if top_k <= 0 or not len(self.codes):
+            # FAISS asserts k > 0, so answer empty searches before reaching it
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        if self.index is not None:
+            query = np.ascontiguousarray(query_embedding[None, :], dtype=np.float32)
+            scores, indices = self.index.search(query, min(top_k, self.index.ntotal))
+            found = indices[0] >= 0
+            return indices[0][found], scores[0][found]
+
+        # Embeddings are unit-length, so the dot product is the cosine similarity
+        similarities = int8_scores(self.codes, self.scales, query_embedding)
+        indices = top_k_indices(similarities, top_k)
+        return indices, similarities[indices]
+
+def local_encoder_available() -> bool:
+    """Whether the optional ONNX Runtime stack for LocalEncoder is installed"""
+    return ORTModelForFeatureExtraction is not None
+
+def length_order(texts: List[str]) -> np.ndarray:
+    """Text indices sorted by word count, shortest first"""
+    return np.argsort([len(text.split()) for text in texts], kind='stable')
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[np.ndarray]:
+    """Split text indices into batches of similar length so little of each batch is padding"""
+    order = length_order(texts)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+def normalize_rows(vecs: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place so dot products are cosine similarities"""
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vecs /= norms
+    return vecs
+
+def corpus_cache_key(raw_data_dir: Path, model_name: str, chunk_size: int, chunk_overlap: int) -> str:
+    """Fingerprint the raw documents and pipeline settings without reading file contents"""
+    raw_data_dir = Path(raw_data_dir)
+    files = sorted(
+        (str(f.relative_to(raw_data_dir)), f.stat().st_mtime_ns, f.stat().st_size)
+        for f in raw_data_dir.rglob('*') if f.is_file()
+    )
+    settings = [CORPUS_CACHE_VERSION, model_name, chunk_size, chunk_overlap]
+    return hashlib.sha256(json.dumps([files, settings]).encode('utf-8')).hexdigest()
+
+def load_corpus_cache(cache_dir: Path, key: str) -> Optional[Tuple[List[Dict], int, VectorIndex]]:
+    """Return (chunks, document_count, index) saved under key, or None on a cache miss
+
+    The .npz is written last, so it marks a complete entry. A missing or unreadable
+    piece is still treated as a miss, and the caller rebuilds and resaves the corpus.
+    """
+    cache_dir = Path(cache_dir)
+    cache_path = cache_dir / f"corpus_{key}.npz"
+    if not cache_path.exists():
+        return None
+
+    try:
+        with np.load(cache_path) as data:
+            document_count = int(data['document_count'])
+            scales = data['scales']
+
+        with open(cache_dir / f"corpus_{key}.json", 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+
+        # Arrays inside an .npz can't be memory-mapped, so the codes live in their own .npy
+        codes = np.load(cache_dir / f"corpus_{key}.codes.npy", mmap_mode='r')
+
+        return chunks, document_count, VectorIndex.load(codes, scales, cache_dir / f"corpus_{key}.faiss")
+    except (OSError, ValueError, KeyError, EOFError, RuntimeError, zipfile.BadZipFile):
+        return None
+
+def save_corpus_cache(cache_dir: Path, key: str, chunks: List[Dict], document_count: int, index: VectorIndex):
+    """Save processed chunks and their index so an unchanged corpus loads without re-embedding
+
+    Entries saved under other keys describe documents that have since changed, so they are deleted.
+    """
+    cache_dir = Path(cache_dir)
+    stale = [*cache_dir.glob("corpus_*"), *cache_dir.glob(".tmp-corpus_*"), *cache_dir.glob("embeddings_*.npy")]
+    for path in stale:
+        if not path.name.startswith((f"corpus_{key}.", f".tmp-corpus_{key}.")):
+            try:
+                path.unlink()
+            except OSError:  # Still open elsewhere (e.g. mapped on Windows); retried on the next save
+                pass
+
+    # Each file is replaced whole, and the .npz goes last so a partial save reads as a miss.
+    # Chunks go in plain JSON; as a NumPy string scalar they would take 4 bytes per character
+    _write_replacing(cache_dir / f"corpus_{key}.json", lambda f: f.write(json.dumps(chunks).encode('utf-8')))
+    _write_replacing(cache_dir / f"corpus_{key}.codes.npy", lambda f: np.save(f, index.codes))
+    index.save(cache_dir / f"corpus_{key}.faiss")
+    _write_replacing(
+        cache_dir / f"corpus_{key}.npz",
+        lambda f: np.savez(f, document_count=np.array(document_count), scales=index.scales)
+    )
+
+def _tmp_path(path: Path) -> Path:
+    """Sibling path a file is written to before replacing path"""
+    return path.with_name(f".tmp-{path.name}")
+
+def _write_replacing(path: Path, write):
+    """Write a file through write(f) to a temporary sibling, then move it over path
+
+    Readers see either the old file or the complete new one, never a truncated one,
+    and a file memory-mapped from the old path stays valid.
+    """
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
@@ -1,8 +1,26 @@
-from typing import List, Dict
+import os
+from typing import List, Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor
 import re
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.text_splitter import CharacterTextSplitter
 
+# Compiled once so per-line and per-chunk loops skip the re module's pattern cache lookup
+_SENT_RE = re.compile(r'[.!?]+')
+_HDR_LINE_RE = re.compile(r'^#{1,6}[^\S\n]([^\n]*)', re.MULTILINE)  # A header line; group 1 is its title
+
+# Every byte except ASCII letters, deleted with bytes.translate to count letters in C
+_NON_ALPHA_BYTES = bytes(b for b in range(256) if not (65 <= b <= 90 or 97 <= b <= 122))
+
+# Less text than this is chunked in-process; the splitters get through ~10 MB/s, so
+# smaller corpora finish before a worker pool would have started
+PARALLEL_MIN_CHARS = 4_000_000
+
+def _text_stats(text: str) -> Tuple[int, int, bool]:
+    """(ASCII letter count, space count, has . ! or ?) of text, each counted in C over its bytes"""
+    data = text.encode('ascii', 'ignore')
+    return len(data.translate(None, _NON_ALPHA_BYTES)), data.count(b' '), any(p in data for p in (b'.', b'!', b'?'))
+
 class TextChunker:
     """Handles text chunking with various strategies"""
     
@@ -24,35 +42,38 @@ class TextChunker:
         # Split by double newlines first (paragraphs)
         paragraphs = text.split('\n\n')
         chunks = []
-        current_chunk = ""
+        # Chunks are built as lists of pieces with a running length and joined once when emitted
+        current_parts, current_len = [], 0
         
         for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) <= self.chunk_size:
-                current_chunk += paragraph + "\n\n"
+            if current_len + len(paragraph) <= self.chunk_size:
+                current_parts += (paragraph, "\n\n")
+                current_len += len(paragraph) + 2
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
+                if current_parts:
+                    chunks.append(''.join(current_parts).strip())
                 
                 # If paragraph itself is too long, split by sentences
                 if len(paragraph) > self.chunk_size:
-                    sentences = re.split(r'[.!?]+', paragraph)
-                    temp_chunk = ""
+                    sentences = _SENT_RE.split(paragraph)
+                    temp_parts, temp_len = [], 0
                     
                     for sentence in sentences:
-                        if len(temp_chunk) + len(sentence) <= self.chunk_size:
-                            temp_chunk += sentence + ". "
+                        if temp_len + len(sentence) <= self.chunk_size:
+                            temp_parts += (sentence, ". ")
+                            temp_len += len(sentence) + 2
                         else:
-                            if temp_chunk:
-                                chunks.append(temp_chunk.strip())
-                            temp_chunk = sentence + ". "
+                            if temp_parts:
+                                chunks.append(''.join(temp_parts).strip())
+                            temp_parts, temp_len = [sentence, ". "], len(sentence) + 2
                     
-                    if temp_chunk:
-                        current_chunk = temp_chunk
+                    if temp_parts:
+                        current_parts, current_len = temp_parts, temp_len
                 else:
-                    current_chunk = paragraph + "\n\n"
+                    current_parts, current_len = [paragraph, "\n\n"], len(paragraph) + 2
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            chunks.append(''.join(current_parts).strip())
         
         return chunks
     
@@ -67,78 +88,88 @@ class TextChunker:
     
     def chunk_by_headers(self, text: str) -> List[Dict]:
         """Split text by markdown-style headers"""
-        # Find headers (lines starting with #)
-        lines = text.split('\n')
+        # Find headers (lines starting with #) in one scan; each section is the slice up to the next one
         chunks = []
-        current_section = ""
+        section_start = 0
         current_header = "Introduction"
         
-        for line in lines:
-            if re.match(r'^#{1,6}\s', line):
-                # Save previous section
-                if current_section.strip():
-                    chunks.append({
-                        'content': current_section.strip(),
-                        'header': current_header,
-                        'section_type': 'header_based'
-                    })
-                
-                # Start new section
-                current_header = re.sub(r'^#{1,6}\s', '', line)
-                current_section = line + '\n'
-            else:
-                current_section += line + '\n'
+        for match in _HDR_LINE_RE.finditer(text):
+            # Save previous section
+            content = text[section_start:match.start()].strip()
+            if content:
+                chunks.append({
+                    'content': content,
+                    'header': current_header,
+                    'section_type': 'header_based'
+                })
+            
+            # Start new section
+            current_header = match.group(1)
+            section_start = match.start()
         
         # Add the last section
-        if current_section.strip():
+        content = text[section_start:].strip()
+        if content:
             chunks.append({
-                'content': current_section.strip(),
+                'content': content,
                 'header': current_header,
                 'section_type': 'header_based'
             })
         
         return chunks
     
+    def chunk_document(self, doc: Dict, chunking_method: str = "recursive") -> List[Dict]:
+        """Chunk a single document into chunks with metadata; chunk_index is left for the caller"""
+        text = doc.get('content', '')
+        doc_chunks = []
+        
+        if chunking_method == "recursive":
+            chunks = self.recursive_chunk(text)
+        elif chunking_method == "semantic":
+            chunks = self.semantic_chunk(text)
+        elif chunking_method == "fixed":
+            chunks = self.fixed_size_chunk(text)
+        elif chunking_method == "headers":
+            header_chunks = self.chunk_by_headers(text)
+            for chunk_data in header_chunks:
+                doc_chunks.append({
+                    'content': chunk_data['content'],
+                    'source': doc.get('source', ''),
+                    'filename': doc.get('filename', ''),
+                    'file_type': doc.get('file_type', ''),
+                    'header': chunk_data.get('header', ''),
+                    'chunking_method': chunking_method
+                })
+            return doc_chunks
+        else:
+            chunks = self.recursive_chunk(text)  # Default fallback
+        
+        # Add metadata to each chunk
+        for chunk in chunks:
+            if len(chunk.strip()) > 50:  # Skip very short chunks
+                doc_chunks.append({
+                    'content': chunk,
+                    'source': doc.get('source', ''),
+                    'filename': doc.get('filename', ''),
+                    'file_type': doc.get('file_type', ''),
+                    'chunking_method': chunking_method
+                })
+        
+        return doc_chunks
+    
     def process_documents(self, documents: List[Dict], chunking_method: str = "recursive") -> List[Dict]:
         """Process multiple documents and return chunks with metadata"""
-        all_chunks = []
+        # Documents are chunked independently and the splitters are CPU-bound, so spread them across processes
+        if len(documents) > 1 and sum(len(doc.get('content', '')) for doc in documents) >= PARALLEL_MIN_CHARS:
+            max_workers = min(os.cpu_count() or 1, len(documents))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(self.chunk_document, documents, [chunking_method] * len(documents)))
+        else:
+            results = [self.chunk_document(doc, chunking_method) for doc in documents]
         
-        for doc in documents:
-            text = doc.get('content', '')
-            
-            if chunking_method == "recursive":
-                chunks = self.recursive_chunk(text)
-            elif chunking_method == "semantic":
-                chunks = self.semantic_chunk(text)
-            elif chunking_method == "fixed":
-                chunks = self.fixed_size_chunk(text)
-            elif chunking_method == "headers":
-                header_chunks = self.chunk_by_headers(text)
-                for chunk_data in header_chunks:
-                    all_chunks.append({
-                        'content': chunk_data['content'],
-                        'source': doc.get('source', ''),
-                        'filename': doc.get('filename', ''),
-                        'file_type': doc.get('file_type', ''),
-                        'chunk_index': len(all_chunks),
-                        'header': chunk_data.get('header', ''),
-                        'chunking_method': chunking_method
-                    })
-                continue
-            else:
-                chunks = self.recursive_chunk(text)  # Default fallback
-            
-            # Add metadata to each chunk
-            for i, chunk in enumerate(chunks):
-                if len(chunk.strip()) > 50:  # Skip very short chunks
-                    all_chunks.append({
-                        'content': chunk,
-                        'source': doc.get('source', ''),
-                        'filename': doc.get('filename', ''),
-                        'file_type': doc.get('file_type', ''),
-                        'chunk_index': len(all_chunks),
-                        'chunking_method': chunking_method
-                    })
+        all_chunks = [chunk for doc_chunks in results for chunk in doc_chunks]
+        for chunk_index, chunk in enumerate(all_chunks):
+            chunk['chunk_index'] = chunk_index
         
         return all_chunks
     
@@ -153,14 +184,16 @@ class TextChunker:
             if len(content) < 50:  # Too short
                 continue
             
-            if content.count(' ') < 5:  # Not enough words
+            # Letters, spaces and sentence endings tallied in a single pass over the chunk
+            word_chars, spaces, has_sentence_end = _text_stats(content)
+            
+            if spaces < 5:  # Not enough words
                 continue
             
-            if not re.search(r'[.!?]', content):  # No sentence endings
+            if not has_sentence_end:  # No sentence endings
                 continue
             
             # Check for reasonable text (not just numbers/symbols)
-            word_chars = len(re.findall(r'[a-zA-Z]', content))
             if word_chars / len(content) < 0.5:
                 continue
             